@@ -7,7 +7,11 @@ from src.trello_logic import (
     generate_detailed_report, generate_time_analysis_report,
     generate_movement_report, generate_current_status_report,
     generate_velocity_report, save_report_to_excel,
-    save_env_vars, test_trello_connection
+    save_env_vars, test_trello_connection,
+    prefetch_card_histories, clear_card_history_cache,
+    append_board_snapshot, generate_historical_status_report,
+    generate_snapshot_diff_report, get_report_server_url,
+    get_server_board, fetch_report_from_server
 )
 
 ctk.set_appearance_mode("System")
@@ -27,6 +31,8 @@ class TrelloApp(ctk.CTk):
         self.api_key, self.token, self.board_id = None, None, None
         self.lists, self.cards, self.list_id_to_name = [], [], {}
         self.is_loading = False
+        self.prefetch_stop = None
+        self.server_url = None
 
         # --- Title ---
         self.label = ctk.CTkLabel(self, text="Generador de Reportes Trello", font=("Arial", 20))
@@ -49,8 +55,10 @@ class TrelloApp(ctk.CTk):
         self.report_options = {
             "Reporte Detallado": "1", "Análisis de Tiempos": "2",
             "Reporte de Movimientos": "3", "Estado Actual": "4",
-            "Análisis de Velocidad": "5", "Reporte Completo": "6"
+            "Análisis de Velocidad": "5", "Reporte Completo": "6",
+            "Estado Histórico": "7"
         }
+        self.report_names = {"1": "Detallado", "2": "Tiempos", "3": "Movimientos", "4": "Estado", "5": "Velocidad", "6": "Completo", "7": "Historico"}
         
         row, col = 0, 0
         for name, val in self.report_options.items():
@@ -84,11 +92,19 @@ class TrelloApp(ctk.CTk):
     def load_trello_data(self):
         if self.is_loading: return
         self.is_loading = True
+        self.stop_prefetch()
         self.update_status("Cargando datos...", 0.1)
         self.load_button.configure(state="disabled")
 
         def task():
             try:
+                self.server_url = get_report_server_url()
+                if self.server_url:
+                    self.update_status("Obteniendo datos del servidor de reportes...", 0.5)
+                    self.lists, self.cards = get_server_board(self.server_url)
+                    self.list_id_to_name = {lst['id']: lst['name'] for lst in self.lists}
+                    self.update_status(f"Datos del servidor: {len(self.lists)} listas, {len(self.cards)} tarjetas.")
+                    return
                 creds, _ = load_env_vars()
                 if not creds:
                     self.show_error("Variables de entorno no encontradas. Asegúrate de que el archivo .env está configurado.")
@@ -99,7 +115,13 @@ class TrelloApp(ctk.CTk):
                 self.list_id_to_name = {lst['id']: lst['name'] for lst in self.lists}
                 self.update_status("Obteniendo tarjetas...", 0.6)
                 self.cards = get_cards(self.api_key, self.token, self.board_id)
-                self.update_status(f"Datos cargados: {len(self.lists)} listas, {len(self.cards)} tarjetas.")
+                self.start_prefetch()
+                status = f"Datos cargados: {len(self.lists)} listas, {len(self.cards)} tarjetas."
+                try:
+                    append_board_snapshot(self.board_id, self.cards, self.lists)
+                except Exception as e:
+                    status += f" Aviso: no se pudo guardar el snapshot histórico ({e})."
+                self.update_status(status)
             except Exception as e:
                 self.show_error(f"Error al cargar datos: {e}")
             finally:
@@ -108,6 +130,22 @@ class TrelloApp(ctk.CTk):
         
         threading.Thread(target=task).start()
 
+    def stop_prefetch(self):
+        """Cancela la precarga de historiales en curso, si la hay."""
+        if self.prefetch_stop:
+            self.prefetch_stop.set()
+            self.prefetch_stop = None
+
+    def start_prefetch(self):
+        """Inicia la precarga de historiales en segundo plano, cancelando la anterior."""
+        self.stop_prefetch()
+        self.prefetch_stop = threading.Event()
+        threading.Thread(
+            target=prefetch_card_histories,
+            args=(self.api_key, self.token, self.cards, self.prefetch_stop),
+            daemon=True
+        ).start()
+
     def generate_report(self, report_type):
         if not self.cards:
             self.show_error("Por favor, cargue los datos del tablero primero.")
@@ -124,6 +162,13 @@ class TrelloApp(ctk.CTk):
                 return
             start_date, end_date = date_range_window.get_dates()
 
+        snapshot_date = None
+        if report_type == "7":
+            snapshot_date = self.ask_snapshot_date()
+            if not snapshot_date:
+                self.is_loading = False
+                return
+
         filename = self.ask_save_filename(report_type)
         if not filename:
             self.is_loading = False
@@ -133,6 +178,13 @@ class TrelloApp(ctk.CTk):
 
         def task():
             try:
+                if self.server_url:
+                    report_name = self.report_names[report_type].lower()
+                    fetch_report_from_server(self.server_url, report_name, filename, start_date, end_date, snapshot_date)
+                    self.update_status(f"¡Reporte guardado en {filename}!")
+                    messagebox.showinfo("Éxito", f"Reporte generado y guardado exitosamente en:\n{filename}")
+                    return
+
                 reports = {}
                 if report_type == "1":
                     reports["Detallado"] = generate_detailed_report(self.cards, self.list_id_to_name, self.api_key, self.token, start_date, end_date, self.update_status)
@@ -157,6 +209,10 @@ class TrelloApp(ctk.CTk):
                     reports["Estado_Detalle"], reports["Estado_Resumen"] = df, summary
                     self.update_status("Generando Análisis de Velocidad...", 0.9)
                     reports["Velocidad"] = generate_velocity_report(self.cards, self.list_id_to_name, self.api_key, self.token)
+                elif report_type == "7":
+                    df, summary = generate_historical_status_report(self.board_id, snapshot_date)
+                    reports["Historico_Detalle"], reports["Historico_Resumen"] = df, summary
+                    reports["Cambios_Desde_Fecha"] = generate_snapshot_diff_report(self.board_id, snapshot_date)
 
                 self.update_status("Guardando archivo Excel...", 0.95)
                 save_report_to_excel(reports, filename)
@@ -170,9 +226,19 @@ class TrelloApp(ctk.CTk):
 
         threading.Thread(target=task).start()
 
+    def ask_snapshot_date(self):
+        """Pide la fecha del estado histórico; devuelve el final de ese día o None."""
+        value = ctk.CTkInputDialog(text="Fecha del estado a consultar (YYYY-MM-DD):", title="Estado Histórico").get_input()
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value.strip(), '%Y-%m-%d') + timedelta(days=1, microseconds=-1)
+        except ValueError:
+            messagebox.showerror("Error de formato", "Formato de fecha inválido. Use YYYY-MM-DD.")
+            return None
+
     def ask_save_filename(self, report_type):
-        report_names = {"1": "Detallado", "2": "Tiempos", "3": "Movimientos", "4": "Estado", "5": "Velocidad", "6": "Completo"}
-        initial_name = f"Reporte_{report_names.get(report_type, 'Trello')}_{datetime.now().strftime('%Y%m%d')}.xlsx"
+        initial_name = f"Reporte_{self.report_names.get(report_type, 'Trello')}_{datetime.now().strftime('%Y%m%d')}.xlsx"
         return filedialog.asksaveasfilename(
             initialfile=initial_name,
             defaultextension=".xlsx",
@@ -275,6 +341,8 @@ class SettingsWindow(ctk.CTkToplevel):
         
         try:
             save_env_vars(api_key, token, board_id, theme)
+            self.master.stop_prefetch()
+            clear_card_history_cache()
             messagebox.showinfo("Éxito", "La configuración se ha guardado correctamente.\nReinicia la aplicación para ver los cambios en el tema.")
             self.master.load_trello_data() # Recargar datos en la ventana principal
             self.destroy()
@@ -0,0 +1,327 @@
+import os
+import sys
+import hmac
+import json
+import argparse
+import time
+import tempfile
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from src.trello_logic import (
+    load_env_vars, get_lists, get_cards, REPORT_TOKEN_HEADER,
+    generate_detailed_report, generate_time_analysis_report,
+    generate_movement_report, generate_current_status_report,
+    generate_velocity_report, save_report_to_excel,
+    prefetch_card_histories, append_board_snapshot, get_card_history_failure_count,
+    generate_historical_status_report, generate_snapshot_diff_report
+)
+
+REPORT_NAMES = ["detallado", "tiempos", "movimientos", "estado", "velocidad", "completo", "historico"]
+
+# --- Datos del tablero en memoria ---
+
+class BoardDataStore:
+    """Mantiene listas, tarjetas e historiales del tablero en memoria y los refresca periódicamente."""
+
+    def __init__(self, api_key, token, board_id, refresh_minutes=15, min_refresh_seconds=60):
+        self.api_key, self.token, self.board_id = api_key, token, board_id
+        self.refresh_minutes = refresh_minutes
+        self.min_refresh_seconds = min_refresh_seconds
+        self.lists, self.cards, self.list_id_to_name = [], [], {}
+        self.version = 0
+        self.refreshed_at = None
+        self._last_refresh_started = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._warmup_stop = None
+
+    def refresh(self):
+        """Descarga el tablero, guarda un snapshot y precalienta los historiales.
+
+        Si ya hay un refresco en curso no se lanza otro y se devuelve False. El
+        bloqueo se libera al publicar los datos nuevos; la precarga posterior se
+        cancela si empieza otro refresco.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            with self._lock:
+                self._last_refresh_started = time.monotonic()
+            lists = get_lists(self.api_key, self.token, self.board_id)
+            cards = get_cards(self.api_key, self.token, self.board_id)
+            try:
+                append_board_snapshot(self.board_id, cards, lists)
+            except Exception as e:
+                print(f"[{datetime.now():%H:%M:%S}] Aviso: no se pudo guardar el snapshot histórico: {e}", file=sys.stderr)
+            warmup_stop = threading.Event()
+            with self._lock:
+                self.lists, self.cards = lists, cards
+                self.list_id_to_name = {lst['id']: lst['name'] for lst in lists}
+                self.version += 1
+                self.refreshed_at = datetime.now(timezone.utc)
+                if self._warmup_stop:
+                    self._warmup_stop.set()
+                self._warmup_stop = warmup_stop
+                if self._stop_event.is_set():
+                    warmup_stop.set()
+        finally:
+            self._refresh_lock.release()
+        prefetch_card_histories(self.api_key, self.token, cards, warmup_stop)
+        return True
+
+    def request_refresh(self):
+        """Lanza un refresco en segundo plano.
+
+        No hace nada si ya hay uno en curso o si el último empezó hace menos de
+        `min_refresh_seconds`. Devuelve True si se lanzó un refresco nuevo.
+        """
+        with self._lock:
+            now = time.monotonic()
+            recent = (self._last_refresh_started is not None
+                      and now - self._last_refresh_started < self.min_refresh_seconds)
+            if self._refresh_lock.locked() or recent:
+                return False
+            self._last_refresh_started = now
+        threading.Thread(target=self._logged_refresh, daemon=True).start()
+        return True
+
+    def _logged_refresh(self):
+        try:
+            if self.refresh():
+                print(f"[{datetime.now():%H:%M:%S}] Tablero actualizado: {len(self.cards)} tarjetas.")
+        except Exception as e:
+            print(f"[{datetime.now():%H:%M:%S}] Error al actualizar el tablero: {e}", file=sys.stderr)
+
+    def current(self):
+        """Devuelve una vista consistente de los datos: (versión, tarjetas, listas, id→nombre)."""
+        with self._lock:
+            return self.version, self.cards, self.lists, self.list_id_to_name
+
+    def start(self):
+        """Inicia el refresco periódico en un hilo en segundo plano."""
+        def loop():
+            while not self._stop_event.is_set():
+                self._logged_refresh()
+                self._stop_event.wait(self.refresh_minutes * 60)
+
+        threading.Thread(target=loop, daemon=True).start()
+
+    def stop(self):
+        with self._lock:
+            self._stop_event.set()
+            if self._warmup_stop:
+                self._warmup_stop.set()
+
+# --- Generación de reportes con deduplicación ---
+
+def _start_of_day(date):
+    return date.replace(hour=0, minute=0, second=0, microsecond=0) if date else None
+
+def _end_of_day(date):
+    return date.replace(hour=23, minute=59, second=59, microsecond=999999) if date else None
+
+class ReportService:
+    """Genera reportes sobre los datos en memoria, compartiendo el resultado entre peticiones idénticas.
+
+    Las peticiones concurrentes con los mismos parámetros esperan a una única
+    generación, y el resultado se reutiliza hasta el siguiente refresco del tablero.
+    Si durante la generación falló la descarga de algún historial, el resultado
+    se entrega a las peticiones en espera pero no se guarda.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._results = {}
+
+    def get_report(self, report_name, start_date=None, end_date=None, snapshot_date=None):
+        if report_name not in REPORT_NAMES:
+            raise ValueError(f"Reporte desconocido: {report_name}")
+        if report_name == "historico" and snapshot_date is None:
+            raise ValueError("El reporte histórico requiere el parámetro 'date'.")
+
+        # Las fechas se redondean al día para que peticiones equivalentes
+        # (p. ej. "últimos 7 días" de distintos analistas) compartan resultado.
+        start_date, end_date, snapshot_date = _start_of_day(start_date), _end_of_day(end_date), _end_of_day(snapshot_date)
+
+        version, cards, _, list_id_to_name = self.store.current()
+        if version == 0:
+            raise RuntimeError("Los datos del tablero aún no se han cargado.")
+
+        key = (version, report_name, start_date, end_date, snapshot_date)
+        with self._lock:
+            future = self._results.get(key)
+            is_owner = future is None
+            if is_owner:
+                for old_key in [k for k in self._results if k[0] != version]:
+                    del self._results[old_key]
+                future = self._results[key] = Future()
+
+        if is_owner:
+            failures_before = get_card_history_failure_count()
+            try:
+                reports = self._build_reports(report_name, cards, list_id_to_name,
+                                              start_date, end_date, snapshot_date)
+            except Exception as e:
+                with self._lock:
+                    self._results.pop(key, None)
+                future.set_exception(e)
+            else:
+                if get_card_history_failure_count() != failures_before:
+                    with self._lock:
+                        self._results.pop(key, None)
+                future.set_result(reports)
+        return future.result()
+
+    def _build_reports(self, report_name, cards, list_id_to_name, start_date, end_date, snapshot_date):
+        api_key, token, board_id = self.store.api_key, self.store.token, self.store.board_id
+        reports = {}
+        if report_name in ("detallado", "completo"):
+            reports["Detallado"] = generate_detailed_report(cards, list_id_to_name, api_key, token, start_date, end_date)
+        if report_name in ("tiempos", "completo"):
+            reports["Tiempos"] = generate_time_analysis_report(cards, list_id_to_name, api_key, token)
+        if report_name in ("movimientos", "completo"):
+            reports["Movimientos"] = generate_movement_report(cards, list_id_to_name, api_key, token, start_date, end_date)
+        if report_name in ("estado", "completo"):
+            reports["Estado_Detalle"], reports["Estado_Resumen"] = generate_current_status_report(cards, list_id_to_name)
+        if report_name in ("velocidad", "completo"):
+            reports["Velocidad"] = generate_velocity_report(cards, list_id_to_name, api_key, token)
+        if report_name == "historico":
+            reports["Historico_Detalle"], reports["Historico_Resumen"] = generate_historical_status_report(board_id, snapshot_date)
+            reports["Cambios_Desde_Fecha"] = generate_snapshot_diff_report(board_id, snapshot_date)
+        return reports
+
+# --- API HTTP ---
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """Expone el tablero y los reportes:
+
+    GET  /board                    -> listas y tarjetas en JSON
+    GET  /reports/<nombre>?...     -> reporte en JSON (format=json) o Excel (format=xlsx)
+    POST /refresh                  -> lanza un refresco en segundo plano (se reutiliza el que esté en curso)
+
+    Si el servidor tiene un token configurado, todas las rutas exigen la cabecera
+    `X-Report-Token` con ese valor.
+    """
+
+    def is_authorized(self):
+        expected = getattr(self.server, "auth_token", None)
+        if not expected:
+            return True
+        received = self.headers.get(REPORT_TOKEN_HEADER, "")
+        if hmac.compare_digest(received.encode("utf-8"), expected.encode("utf-8")):
+            return True
+        self.send_json(401, {"error": "Token del servidor de reportes inválido o ausente."})
+        return False
+
+    def do_GET(self):
+        if not self.is_authorized():
+            return
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/")
+        service = self.server.service
+
+        if parts == ["board"]:
+            version, cards, lists, _ = service.store.current()
+            if version == 0:
+                return self.send_json(503, {"error": "Los datos del tablero aún no se han cargado."})
+            refreshed_at = service.store.refreshed_at
+            return self.send_json(200, {"version": version, "lists": lists, "cards": cards,
+                                        "refreshed_at": refreshed_at.isoformat() if refreshed_at else None})
+
+        if len(parts) != 2 or parts[0] != "reports":
+            return self.send_json(404, {"error": "Ruta no encontrada."})
+        if parts[1] not in REPORT_NAMES:
+            return self.send_json(404, {"error": f"Reporte desconocido: {parts[1]}"})
+
+        try:
+            start_date, end_date, snapshot_date = (
+                datetime.fromisoformat(params[name]) if params.get(name) else None
+                for name in ("start", "end", "date")
+            )
+            reports = service.get_report(parts[1], start_date, end_date, snapshot_date)
+        except ValueError as e:
+            return self.send_json(400, {"error": str(e)})
+        except RuntimeError as e:
+            return self.send_json(503, {"error": str(e)})
+        except Exception as e:
+            return self.send_json(500, {"error": f"Error al generar el reporte: {e}"})
+
+        if params.get("format", "json") == "xlsx":
+            return self.send_excel(reports)
+        return self.send_json(200, {name: json.loads(df.to_json(orient="split", index=False, force_ascii=False))
+                                    for name, df in reports.items()})
+
+    def do_POST(self):
+        if not self.is_authorized():
+            return
+        if urlparse(self.path).path.strip("/") != "refresh":
+            return self.send_json(404, {"error": "Ruta no encontrada."})
+        store = self.server.service.store
+        started = store.request_refresh()
+        version, _, _, _ = store.current()
+        return self.send_json(202, {"started": started, "version": version})
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_excel(self, reports):
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            save_report_to_excel(reports, path)
+            with open(path, "rb") as f:
+                body = f.read()
+        finally:
+            os.remove(path)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def run_server(host="127.0.0.1", port=8765, refresh_minutes=15):
+    """Arranca el servidor de reportes con las credenciales del archivo .env.
+
+    Fuera de 127.0.0.1/localhost exige `REPORT_SERVER_TOKEN`, ya que la API expone
+    todas las tarjetas del tablero y puede lanzar refrescos contra la API de Trello.
+    """
+    creds, _ = load_env_vars()
+    if not creds:
+        raise SystemExit("Variables de entorno no encontradas. Asegúrate de que el archivo .env está configurado.")
+    auth_token = os.getenv("REPORT_SERVER_TOKEN")
+    if not auth_token and host not in ("127.0.0.1", "localhost", "::1"):
+        raise SystemExit("Para escuchar fuera de 127.0.0.1 define REPORT_SERVER_TOKEN en el archivo .env.")
+
+    store = BoardDataStore(*creds, refresh_minutes=refresh_minutes)
+    store.start()
+    server = ThreadingHTTPServer((host, port), ReportRequestHandler)
+    server.service = ReportService(store)
+    server.auth_token = auth_token
+    print(f"Servidor de reportes escuchando en http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.stop()
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local de reportes de Trello con caché compartida.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--refresh-minutes", type=float, default=15)
+    args = parser.parse_args()
+    run_server(args.host, args.port, args.refresh_minutes)
@@ -1,5 +1,11 @@
 import os
 import sys
+import json
+import gzip
+import bisect
+import time
+import threading
+import contextlib
 import requests
 import pandas as pd
 from dotenv import load_dotenv
@@ -27,7 +33,7 @@ def get_lists(api_key, token, board_id):
     try:
         url = f"https://api.trello.com/1/boards/{board_id}/lists"
         params = {"key": api_key, "token": token}
-        response = requests.get(url, params=params)
+        response = requests.get(url, params=params, timeout=30)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -38,25 +44,113 @@ def get_cards(api_key, token, board_id):
     try:
         url = f"https://api.trello.com/1/boards/{board_id}/cards"
         params = {"key": api_key, "token": token}
-        response = requests.get(url, params=params)
+        response = requests.get(url, params=params, timeout=30)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         raise ConnectionError(f"Error al obtener tarjetas: {e}")
 
-def get_card_actions(api_key, token, card_id):
-    """Obtiene el historial de acciones de una tarjeta."""
+def fetch_card_actions(api_key, token, card_id, max_retries=3):
+    """Obtiene el historial de acciones de una tarjeta, propagando los errores.
+
+    Cada petición tiene un timeout para que los hilos que esperan una descarga
+    en curso (ver `get_card_history`) siempre se liberen. Ante un 429 (límite de peticiones) espera según `Retry-After` o con backoff
+    exponencial antes de reintentar.
+    """
+    url = f"https://api.trello.com/1/cards/{card_id}/actions"
+    params = {
+        "key": api_key, "token": token,
+        "filter": "updateCard:idList,createCard", "limit": 1000
+    }
+    for attempt in range(max_retries + 1):
+        response = requests.get(url, params=params, timeout=30)
+        if response.status_code != 429 or attempt == max_retries:
+            break
+        try:
+            delay = float(response.headers.get("Retry-After", ""))
+        except ValueError:
+            delay = 2 ** attempt
+        time.sleep(delay)
+    response.raise_for_status()
+    return response.json()
+
+# --- Caché de historiales ---
+
+_card_actions_cache = {}
+_card_actions_pending = {}
+_card_actions_lock = threading.Lock()
+_card_actions_generation = 0
+_card_history_failures = 0
+
+def get_card_history(api_key, token, card):
+    """Obtiene el historial de una tarjeta reutilizando la caché en memoria.
+
+    La entrada se invalida si cambia el `dateLastActivity` de la tarjeta. Si otro
+    hilo ya está descargando el mismo historial, se espera a su resultado. Los
+    errores de descarga devuelven una lista vacía y no se guardan en la caché.
+    """
+    card_id = card['id']
+    last_activity = card.get('dateLastActivity')
+    while True:
+        with _card_actions_lock:
+            cached = _card_actions_cache.get(card_id)
+            if cached and cached[0] == last_activity:
+                return cached[1]
+            pending = _card_actions_pending.get(card_id)
+            if pending is None:
+                pending = threading.Event()
+                _card_actions_pending[card_id] = pending
+                generation = _card_actions_generation
+                break
+        pending.wait()
+
     try:
-        url = f"https://api.trello.com/1/cards/{card_id}/actions"
-        params = {
-            "key": api_key, "token": token,
-            "filter": "updateCard:idList,createCard", "limit": 1000
-        }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
+        actions = fetch_card_actions(api_key, token, card_id)
+        with _card_actions_lock:
+            if generation == _card_actions_generation:
+                _card_actions_cache[card_id] = (last_activity, actions)
+        return actions
     except requests.exceptions.RequestException:
+        global _card_history_failures
+        with _card_actions_lock:
+            _card_history_failures += 1
         return []
+    finally:
+        with _card_actions_lock:
+            del _card_actions_pending[card_id]
+        pending.set()
+
+def prefetch_card_histories(api_key, token, cards, stop_event=None, max_workers=2):
+    """Precarga en segundo plano los historiales, empezando por las tarjetas más activas."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    ordered = sorted(cards, key=lambda c: c.get('dateLastActivity') or '', reverse=True)
+
+    def fetch(card):
+        if stop_event is None or not stop_event.is_set():
+            get_card_history(api_key, token, card)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(fetch, ordered))
+
+def get_card_history_failure_count():
+    """Número de descargas de historial fallidas desde el inicio del proceso.
+
+    Permite saber si un reporte se generó con historiales incompletos
+    comparando el valor antes y después de generarlo.
+    """
+    with _card_actions_lock:
+        return _card_history_failures
+
+def clear_card_history_cache():
+    """Vacía la caché de historiales de tarjetas.
+
+    Las descargas que estén en curso no se guardarán al terminar.
+    """
+    global _card_actions_generation
+    with _card_actions_lock:
+        _card_actions_generation += 1
+        _card_actions_cache.clear()
 
 def format_trello_date(date_str):
     """Convierte fecha de Trello a formato local y legible."""
@@ -127,7 +221,7 @@ def generate_detailed_report(cards, list_id_to_name, api_key, token, start_date=
     total_cards = len(cards)
     
     for i, card in enumerate(cards):
-        actions = get_card_actions(api_key, token, card['id'])
+        actions = get_card_history(api_key, token, card)
         etapas = parse_actions(actions, list_id_to_name)
         
         if start_date or end_date:
@@ -163,7 +257,7 @@ def generate_time_analysis_report(cards, list_id_to_name, api_key, token, progre
     all_times = []
     total_cards = len(cards)
     for i, card in enumerate(cards):
-        actions = get_card_actions(api_key, token, card['id'])
+        actions = get_card_history(api_key, token, card)
         etapas = parse_actions(actions, list_id_to_name)
         for etapa in etapas:
             if etapa['fecha_salida'] and etapa['fecha_entrada']:
@@ -186,7 +280,7 @@ def generate_movement_report(cards, list_id_to_name, api_key, token, start_date=
     movements = []
     total_cards = len(cards)
     for i, card in enumerate(cards):
-        actions = get_card_actions(api_key, token, card['id'])
+        actions = get_card_history(api_key, token, card)
         etapas = parse_actions(actions, list_id_to_name)
         
         if start_date or end_date:
@@ -215,7 +309,7 @@ def generate_velocity_report(cards, list_id_to_name, api_key, token, progress_ca
     client_times = []
     total_cards = len(cards)
     for i, card in enumerate(cards):
-        actions = get_card_actions(api_key, token, card['id'])
+        actions = get_card_history(api_key, token, card)
         etapas = parse_actions(actions, list_id_to_name)
         if len(etapas) > 1:
             try:
@@ -233,6 +327,186 @@ def generate_velocity_report(cards, list_id_to_name, api_key, token, progress_ca
     
     return pd.DataFrame(client_times).sort_values('Tiempo Total (días)')
 
+# --- Snapshots Históricos del Tablero ---
+
+SNAPSHOT_DIR = "snapshots"
+_snapshot_lock = threading.Lock()
+_SNAPSHOT_DELTA_COLUMNS = ['set_cards', 'set_lists', 'removed',
+                           'renamed_cards', 'renamed_card_names', 'renamed_lists', 'renamed_list_names']
+
+def _snapshot_path(board_id, snapshot_dir):
+    return os.path.join(snapshot_dir, f"{board_id}.json.gz")
+
+@contextlib.contextmanager
+def _snapshot_file_lock(path):
+    """Bloqueo exclusivo entre procesos (GUI y servidor) sobre el almacén de un tablero."""
+    with open(path + '.lock', 'a+') as lock_file:
+        if os.name == 'nt':
+            import msvcrt
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _empty_snapshot_store(board_id):
+    store = {
+        'board_id': board_id,
+        'card_ids': [], 'card_names': [],
+        'list_ids': [], 'list_names': [],
+        'taken_at': []
+    }
+    store.update({column: [] for column in _SNAPSHOT_DELTA_COLUMNS})
+    return store
+
+def load_snapshot_store(board_id, snapshot_dir=SNAPSHOT_DIR):
+    """Carga el almacén columnar de snapshots de un tablero (vacío si no existe)."""
+    path = _snapshot_path(board_id, snapshot_dir)
+    if not os.path.exists(path):
+        return _empty_snapshot_store(board_id)
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        store = json.load(f)
+    for column in _SNAPSHOT_DELTA_COLUMNS:
+        store.setdefault(column, [[] for _ in store['taken_at']])
+    return store
+
+def _intern(index, ids, names, item_id, name=None):
+    """Devuelve el índice de un id en el diccionario columnar, añadiéndolo si no existe.
+
+    Para ids nuevos se guarda el nombre inicial; los cambios posteriores de
+    nombre se registran como deltas en cada snapshot.
+    """
+    idx = index.get(item_id)
+    if idx is None:
+        idx = index[item_id] = len(ids)
+        ids.append(item_id)
+        names.append(name or 'Desconocida')
+    return idx
+
+def get_board_state_at(store, date=None):
+    """Reconstruye el tablero vigente en una fecha a partir de los deltas.
+
+    Devuelve (fecha del snapshot, {índice_tarjeta: índice_lista}, nombres de
+    tarjetas, nombres de listas), con los nombres tal como eran en esa fecha.
+    Si no hay ningún snapshot anterior a la fecha, la fecha devuelta es None.
+    """
+    if date is None:
+        count = len(store['taken_at'])
+    else:
+        if date.tzinfo is None:
+            date = date.astimezone()
+        key = date.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        count = bisect.bisect_right(store['taken_at'], key)
+
+    state = {}
+    card_names, list_names = list(store['card_names']), list(store['list_names'])
+    for i in range(count):
+        for card_idx in store['removed'][i]:
+            state.pop(card_idx, None)
+        state.update(zip(store['set_cards'][i], store['set_lists'][i]))
+        for card_idx, name in zip(store['renamed_cards'][i], store['renamed_card_names'][i]):
+            card_names[card_idx] = name
+        for list_idx, name in zip(store['renamed_lists'][i], store['renamed_list_names'][i]):
+            list_names[list_idx] = name
+    taken_at = store['taken_at'][count - 1] if count else None
+    return taken_at, state, card_names, list_names
+
+def append_board_snapshot(board_id, cards, lists, snapshot_dir=SNAPSHOT_DIR, taken_at=None):
+    """Añade un snapshot delta-codificado de las asignaciones tarjeta→lista.
+
+    Solo se guardan las tarjetas que cambiaron de lista, las nuevas, las
+    eliminadas y los cambios de nombre respecto al snapshot anterior. Devuelve
+    False si no hubo cambios.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = _snapshot_path(board_id, snapshot_dir)
+    with _snapshot_lock, _snapshot_file_lock(path):
+        taken_at = taken_at or datetime.now(timezone.utc)
+        store = load_snapshot_store(board_id, snapshot_dir)
+        _, previous, previous_card_names, previous_list_names = get_board_state_at(store)
+
+        list_index = {list_id: i for i, list_id in enumerate(store['list_ids'])}
+        card_index = {card_id: i for i, card_id in enumerate(store['card_ids'])}
+        renamed_lists = {}
+        for lst in lists:
+            list_idx = _intern(list_index, store['list_ids'], store['list_names'], lst['id'], lst['name'])
+            if list_idx < len(previous_list_names) and previous_list_names[list_idx] != lst['name']:
+                renamed_lists[list_idx] = lst['name']
+        current, renamed_cards = {}, {}
+        for card in cards:
+            card_idx = _intern(card_index, store['card_ids'], store['card_names'], card['id'], card['name'])
+            if card_idx < len(previous_card_names) and previous_card_names[card_idx] != card['name']:
+                renamed_cards[card_idx] = card['name']
+            current[card_idx] = _intern(list_index, store['list_ids'], store['list_names'], card.get('idList'))
+
+        changed = sorted(idx for idx, list_idx in current.items() if previous.get(idx) != list_idx)
+        removed = sorted(idx for idx in previous if idx not in current)
+        if store['taken_at'] and not (changed or removed or renamed_cards or renamed_lists):
+            return False
+
+        store['taken_at'].append(taken_at.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'))
+        store['set_cards'].append(changed)
+        store['set_lists'].append([current[idx] for idx in changed])
+        store['removed'].append(removed)
+        store['renamed_cards'].append(sorted(renamed_cards))
+        store['renamed_card_names'].append([renamed_cards[idx] for idx in sorted(renamed_cards)])
+        store['renamed_lists'].append(sorted(renamed_lists))
+        store['renamed_list_names'].append([renamed_lists[idx] for idx in sorted(renamed_lists)])
+
+        tmp_path = path + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(store, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    return True
+
+def generate_historical_status_report(board_id, date, snapshot_dir=SNAPSHOT_DIR):
+    """Genera el estado del tablero en una fecha a partir de los snapshots locales."""
+    store = load_snapshot_store(board_id, snapshot_dir)
+    taken_at, state, card_names, list_names = get_board_state_at(store, date)
+    if taken_at is None:
+        raise ValueError(f"No hay snapshots guardados anteriores a {date:%Y-%m-%d %H:%M}.")
+
+    status = [{'Cliente': card_names[card_idx], 'Etapa': list_names[list_idx],
+               'Fecha Snapshot': format_trello_date(taken_at)} for card_idx, list_idx in state.items()]
+    df = pd.DataFrame(status, columns=['Cliente', 'Etapa', 'Fecha Snapshot'])
+    summary = df.groupby('Etapa').size().reset_index(name='Cantidad')
+    return df, summary
+
+def generate_snapshot_diff_report(board_id, date_from, date_to=None, snapshot_dir=SNAPSHOT_DIR):
+    """Compara el estado del tablero entre dos fechas usando los snapshots locales.
+
+    Las etapas se muestran con el nombre que tenían en cada fecha.
+    """
+    store = load_snapshot_store(board_id, snapshot_dir)
+    _, before, _, list_names_before = get_board_state_at(store, date_from)
+    _, after, card_names, list_names_after = get_board_state_at(store, date_to)
+
+    changes = []
+    for card_idx in sorted(set(before) | set(after)):
+        list_before, list_after = before.get(card_idx), after.get(card_idx)
+        if list_before == list_after:
+            continue
+        changes.append({
+            'Cliente': card_names[card_idx],
+            'Etapa Anterior': list_names_before[list_before] if list_before is not None else None,
+            'Etapa Nueva': list_names_after[list_after] if list_after is not None else None
+        })
+    return pd.DataFrame(changes, columns=['Cliente', 'Etapa Anterior', 'Etapa Nueva'])
+
 # --- Formato y Guardado Excel ---
 
 def adjust_column_widths(worksheet, dataframe):
@@ -324,21 +598,82 @@ def save_report_to_excel(reports_dict, filename):
                 # Añadir gráficos específicos
                 if sheet_name == "Tiempos":
                     create_time_analysis_chart(worksheet, df)
-                elif sheet_name == "Estado_Resumen":
+                elif sheet_name in ("Estado_Resumen", "Historico_Resumen"):
                     create_status_summary_chart(worksheet, df)
 
     workbook.save(filename)
     workbook.close()
 
+# --- Cliente del Servidor de Reportes ---
+
+REPORT_TOKEN_HEADER = "X-Report-Token"
+
+def get_report_server_url():
+    """Devuelve la URL del servidor de reportes compartido, si está configurada."""
+    load_dotenv()
+    url = os.getenv("REPORT_SERVER_URL")
+    return url.rstrip("/") if url else None
+
+def _server_headers():
+    """Cabecera con el token compartido del servidor de reportes, si está configurado."""
+    load_dotenv()
+    token = os.getenv("REPORT_SERVER_TOKEN")
+    return {REPORT_TOKEN_HEADER: token} if token else {}
+
+def _server_error(response):
+    try:
+        return response.json().get("error", response.text)
+    except ValueError:
+        return response.text
+
+def get_server_board(server_url):
+    """Obtiene las listas y tarjetas que el servidor de reportes mantiene en memoria."""
+    try:
+        response = requests.get(f"{server_url}/board", headers=_server_headers())
+        response.raise_for_status()
+        data = response.json()
+        return data["lists"], data["cards"]
+    except requests.exceptions.HTTPError as e:
+        raise ConnectionError(f"Error del servidor de reportes: {_server_error(e.response)}")
+    except requests.exceptions.RequestException as e:
+        raise ConnectionError(f"Error al conectar con el servidor de reportes: {e}")
+
+def fetch_report_from_server(server_url, report_name, filename=None, start_date=None, end_date=None, snapshot_date=None):
+    """Solicita un reporte al servidor compartido.
+
+    Si se indica `filename` guarda el Excel generado por el servidor y devuelve la
+    ruta; si no, devuelve un diccionario {hoja: DataFrame}. Las fechas se envían
+    con resolución de día: el servidor toma `start` desde el inicio del día y
+    `end`/`date` hasta su final.
+    """
+    params = {"format": "xlsx" if filename else "json"}
+    for name, value in (("start", start_date), ("end", end_date), ("date", snapshot_date)):
+        if value:
+            params[name] = value.date().isoformat()
+    try:
+        response = requests.get(f"{server_url}/reports/{report_name}", params=params, headers=_server_headers())
+        response.raise_for_status()
+    except requests.exceptions.HTTPError as e:
+        raise ConnectionError(f"Error del servidor de reportes: {_server_error(e.response)}")
+    except requests.exceptions.RequestException as e:
+        raise ConnectionError(f"Error al conectar con el servidor de reportes: {e}")
+
+    if filename:
+        with open(filename, "wb") as f:
+            f.write(response.content)
+        return filename
+    return {sheet: pd.DataFrame(data["data"], columns=data["columns"]) for sheet, data in response.json().items()}
+
 # --- Funciones para la ventana de configuración ---
 
 def save_env_vars(api_key, token, board_id, theme="blue"):
-    """Guarda las credenciales y el tema en el archivo .env."""
-    with open(".env", "w") as f:
-        f.write(f"TRELLO_API_KEY={api_key}\n")
-        f.write(f"TRELLO_TOKEN={token}\n")
-        f.write(f"TRELLO_BOARD_ID={board_id}\n")
-        f.write(f"APP_THEME={theme}\n")
+    """Guarda las credenciales y el tema en el archivo .env, conservando el resto de variables."""
+    from dotenv import set_key
+
+    open(".env", "a").close()
+    values = {"TRELLO_API_KEY": api_key, "TRELLO_TOKEN": token, "TRELLO_BOARD_ID": board_id, "APP_THEME": theme}
+    for key, value in values.items():
+        set_key(".env", key, value, quote_mode="never")
 
 def test_trello_connection(api_key, token, board_id):
     """Prueba la conexión con Trello usando las credenciales proporcionadas."""
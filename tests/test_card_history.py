@@ -0,0 +1,135 @@
+import threading
+
+import pytest
+import requests
+
+from src import trello_logic
+
+
+class FetchLog(list):
+    def __init__(self):
+        super().__init__()
+        self.failures = set()
+
+
+@pytest.fixture
+def fetch_calls(monkeypatch):
+    """Sustituye la descarga de historiales por un stub que registra las llamadas."""
+    calls = FetchLog()
+    failures = calls.failures
+
+    def fake_fetch(api_key, token, card_id):
+        calls.append(card_id)
+        if card_id in failures:
+            raise requests.exceptions.HTTPError("429 Too Many Requests")
+        return [{'id': f"action-{card_id}"}]
+
+    monkeypatch.setattr(trello_logic, "fetch_card_actions", fake_fetch)
+    trello_logic.clear_card_history_cache()
+    yield calls
+    trello_logic.clear_card_history_cache()
+
+
+def make_card(card_id, last_activity="2024-01-01T00:00:00.000Z"):
+    return {'id': card_id, 'name': card_id, 'dateLastActivity': last_activity}
+
+
+def test_cached_history_is_not_refetched(fetch_calls):
+    card = make_card("c1")
+    first = trello_logic.get_card_history("k", "t", card)
+    second = trello_logic.get_card_history("k", "t", card)
+    assert first == second == [{'id': "action-c1"}]
+    assert fetch_calls == ["c1"]
+
+
+def test_new_activity_invalidates_cached_history(fetch_calls):
+    card = make_card("c1")
+    trello_logic.get_card_history("k", "t", card)
+    card['dateLastActivity'] = "2024-02-01T00:00:00.000Z"
+    trello_logic.get_card_history("k", "t", card)
+    assert fetch_calls == ["c1", "c1"]
+
+
+def test_failed_fetch_is_not_cached(fetch_calls):
+    card = make_card("c1")
+    fetch_calls.failures.add("c1")
+    assert trello_logic.get_card_history("k", "t", card) == []
+
+    fetch_calls.failures.clear()
+    assert trello_logic.get_card_history("k", "t", card) == [{'id': "action-c1"}]
+    assert fetch_calls == ["c1", "c1"]
+
+
+def test_prefetch_fetches_most_recent_cards_first(fetch_calls):
+    cards = [make_card("old", "2024-01-01"), make_card("new", "2024-03-01"), make_card("mid", "2024-02-01")]
+    trello_logic.prefetch_card_histories("k", "t", cards, max_workers=1)
+    assert fetch_calls == ["new", "mid", "old"]
+
+
+def test_prefetch_stops_when_cancelled(fetch_calls):
+    stop_event = threading.Event()
+    stop_event.set()
+    trello_logic.prefetch_card_histories("k", "t", [make_card("c1")], stop_event)
+    assert fetch_calls == []
+
+
+def test_concurrent_reads_share_a_single_fetch(fetch_calls, monkeypatch):
+    release = threading.Event()
+
+    def slow_fetch(api_key, token, card_id):
+        fetch_calls.append(card_id)
+        release.wait(5)
+        return []
+
+    monkeypatch.setattr(trello_logic, "fetch_card_actions", slow_fetch)
+    card = make_card("c1")
+    threads = [threading.Thread(target=trello_logic.get_card_history, args=("k", "t", card)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert fetch_calls == ["c1"]
+
+
+def test_clear_discards_fetches_in_flight(fetch_calls, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_fetch(api_key, token, card_id):
+        fetch_calls.append(card_id)
+        started.set()
+        release.wait(5)
+        return [{'id': "stale"}]
+
+    monkeypatch.setattr(trello_logic, "fetch_card_actions", slow_fetch)
+    card = make_card("c1")
+    thread = threading.Thread(target=trello_logic.get_card_history, args=("k", "t", card))
+    thread.start()
+    started.wait(5)
+    trello_logic.clear_card_history_cache()
+    release.set()
+    thread.join()
+
+    trello_logic.get_card_history("k", "t", card)
+    assert fetch_calls == ["c1", "c1"]
+
+
+def test_fetch_card_actions_uses_a_timeout(monkeypatch):
+    seen = {}
+
+    class Response:
+        status_code = 200
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return []
+
+    def fake_get(url, params=None, timeout=None):
+        seen['timeout'] = timeout
+        return Response()
+
+    monkeypatch.setattr(trello_logic.requests, "get", fake_get)
+    assert trello_logic.fetch_card_actions("k", "t", "c1") == []
+    assert seen['timeout']
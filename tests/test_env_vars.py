@@ -0,0 +1,22 @@
+from src import trello_logic
+
+
+def test_save_env_vars_keeps_unmanaged_keys(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".env").write_text("TRELLO_TOKEN=viejo\nREPORT_SERVER_URL=http://127.0.0.1:8765\n")
+
+    trello_logic.save_env_vars("key", "nuevo", "board", "green")
+
+    lines = (tmp_path / ".env").read_text().splitlines()
+    assert "REPORT_SERVER_URL=http://127.0.0.1:8765" in lines
+    assert "TRELLO_TOKEN=nuevo" in lines
+    assert {"TRELLO_API_KEY=key", "TRELLO_BOARD_ID=board", "APP_THEME=green"} <= set(lines)
+    assert "TRELLO_TOKEN=viejo" not in lines
+
+
+def test_save_env_vars_creates_missing_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    trello_logic.save_env_vars("key", "token", "board")
+    assert (tmp_path / ".env").read_text().splitlines() == [
+        "TRELLO_API_KEY=key", "TRELLO_TOKEN=token", "TRELLO_BOARD_ID=board", "APP_THEME=blue"
+    ]
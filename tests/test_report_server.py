@@ -0,0 +1,225 @@
+import threading
+
+import pytest
+
+from src import report_server
+
+
+class FakeStore:
+    def __init__(self):
+        self.version = 1
+
+    def current(self):
+        return self.version, [], [], {}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = report_server.ReportService(FakeStore())
+    service.builds = []
+    service.release = threading.Event()
+    service.release.set()
+
+    def fake_build(report_name, cards, list_id_to_name, start_date, end_date, snapshot_date):
+        service.builds.append(report_name)
+        service.release.wait(5)
+        if report_name == "velocidad":
+            raise ConnectionError("sin conexión")
+        return {report_name: object()}
+
+    monkeypatch.setattr(service, "_build_reports", fake_build)
+    return service
+
+
+def test_concurrent_identical_requests_share_one_build(service):
+    service.release.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.get_report("tiempos"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    service.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert service.builds == ["tiempos"]
+    assert len(results) == 5 and all(result is results[0] for result in results)
+
+
+def test_results_are_rebuilt_after_a_refresh(service):
+    service.get_report("tiempos")
+    service.get_report("tiempos")
+    service.store.version = 2
+    service.get_report("tiempos")
+    assert service.builds == ["tiempos", "tiempos"]
+
+
+def test_different_parameters_are_built_separately(service):
+    service.get_report("tiempos")
+    service.get_report("estado")
+    assert service.builds == ["tiempos", "estado"]
+
+
+def test_failed_builds_are_retried(service):
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            service.get_report("velocidad")
+    assert service.builds == ["velocidad", "velocidad"]
+
+
+def test_unknown_report_and_missing_date_are_rejected(service):
+    with pytest.raises(ValueError):
+        service.get_report("desconocido")
+    with pytest.raises(ValueError):
+        service.get_report("historico")
+    assert service.builds == []
+
+
+@pytest.fixture
+def board_store(monkeypatch):
+    crawls, warmups = [], []
+    release, warmup_release = threading.Event(), threading.Event()
+
+    def fake_get_cards(*args):
+        crawls.append(1)
+        release.wait(5)
+        return [{'id': "c1", 'name': "c1", 'idList': "l1"}]
+
+    def fake_prefetch(api_key, token, cards, stop_event):
+        warmups.append(stop_event)
+        warmup_release.wait(5)
+
+    monkeypatch.setattr(report_server, "get_lists", lambda *args: [{'id': "l1", 'name': "Nuevo"}])
+    monkeypatch.setattr(report_server, "get_cards", fake_get_cards)
+    monkeypatch.setattr(report_server, "append_board_snapshot", lambda *args: True)
+    monkeypatch.setattr(report_server, "prefetch_card_histories", fake_prefetch)
+    store = report_server.BoardDataStore("k", "t", "b", min_refresh_seconds=60)
+    store.crawls, store.warmups = crawls, warmups
+    store.release, store.warmup_release = release, warmup_release
+    yield store
+    release.set()
+    warmup_release.set()
+
+
+def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("condición no alcanzada")
+
+
+def test_refresh_requests_are_merged(board_store):
+    board_store.warmup_release.set()
+    assert board_store.request_refresh()
+    wait_for(lambda: board_store.crawls)
+    assert not board_store.request_refresh()
+    assert not board_store.refresh()
+
+    board_store.release.set()
+    wait_for(lambda: board_store.current()[0] == 1)
+    assert board_store.crawls == [1]
+
+
+def test_manual_refreshes_are_rate_limited(board_store):
+    board_store.release.set()
+    board_store.warmup_release.set()
+    assert board_store.refresh()
+    assert not board_store.request_refresh()
+
+    board_store.min_refresh_seconds = 0
+    assert board_store.request_refresh()
+
+
+def test_warmup_does_not_block_the_next_refresh(board_store):
+    board_store.release.set()
+    threading.Thread(target=board_store.refresh, daemon=True).start()
+    wait_for(lambda: board_store.warmups)
+
+    threading.Thread(target=board_store.refresh, daemon=True).start()
+    wait_for(lambda: len(board_store.warmups) == 2)
+    assert board_store.warmups[0].is_set()
+    assert board_store.current()[0] == 2
+
+
+@pytest.fixture
+def http_server():
+    import urllib.request
+    import urllib.error
+
+    server = report_server.ThreadingHTTPServer(("127.0.0.1", 0), report_server.ReportRequestHandler)
+    server.service = report_server.ReportService(FakeStore())
+    server.service.store.refreshed_at = None
+    server.auth_token = "secreto"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def get_status(path, token=None):
+        request = urllib.request.Request(f"http://127.0.0.1:{server.server_port}{path}")
+        if token:
+            request.add_header(report_server.REPORT_TOKEN_HEADER, token)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    get_status.store = server.service.store
+    yield get_status
+    server.shutdown()
+    server.server_close()
+
+
+def test_board_is_unavailable_until_the_first_refresh(http_server):
+    http_server.store.version = 0
+    assert http_server("/board", token="secreto") == 503
+    http_server.store.version = 1
+    assert http_server("/board", token="secreto") == 200
+
+
+def test_requests_without_the_shared_token_are_rejected(http_server):
+    assert http_server("/board") == 401
+    assert http_server("/board", token="otro") == 401
+    assert http_server("/board", token="secreto") == 200
+
+
+def test_reports_built_with_failed_history_fetches_are_not_kept(monkeypatch):
+    import requests
+    from src import trello_logic
+
+    fetches = []
+    failing = {"c2"}
+
+    def fake_fetch(api_key, token, card_id):
+        fetches.append(card_id)
+        if card_id in failing:
+            raise requests.exceptions.ConnectionError("sin conexión")
+        return [{'type': 'createCard', 'date': "2024-01-01T00:00:00.000Z", 'data': {'list': {'id': "l1"}}},
+                {'type': 'updateCard', 'date': "2024-01-03T00:00:00.000Z", 'data': {'listAfter': {'id': "l2"}}}]
+
+    monkeypatch.setattr(trello_logic, "fetch_card_actions", fake_fetch)
+    trello_logic.clear_card_history_cache()
+
+    store = FakeStore()
+    store.api_key, store.token, store.board_id = "k", "t", "b"
+    cards = [{'id': card_id, 'name': card_id, 'idList': "l2", 'dateLastActivity': "2024-01-03"} for card_id in ("c1", "c2")]
+    store.current = lambda: (1, cards, [], {"l1": "Nuevo", "l2": "En curso"})
+    service = report_server.ReportService(store)
+
+    incomplete = service.get_report("movimientos")["Movimientos"]
+    assert incomplete['Cantidad'].tolist() == [1]
+
+    failing.clear()
+    complete = service.get_report("movimientos")["Movimientos"]
+    assert complete['Cantidad'].tolist() == [2]
+    assert fetches == ["c1", "c2", "c2"]
+
+    assert service.get_report("movimientos")["Movimientos"] is complete
+    trello_logic.clear_card_history_cache()
+
+
+def test_requests_for_the_same_days_share_one_build(service):
+    from datetime import datetime
+
+    service.get_report("detallado", datetime(2024, 5, 1, 9, 30, 12, 345), datetime(2024, 5, 8, 9, 30, 12, 345))
+    service.get_report("detallado", datetime(2024, 5, 1, 17, 5), datetime(2024, 5, 8, 17, 5))
+    service.get_report("detallado", datetime(2024, 5, 2), datetime(2024, 5, 8))
+    assert service.builds == ["detallado", "detallado"]
@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+
+from src import trello_logic
+
+
+LISTS = [{'id': "l1", 'name': "Nuevo"}, {'id': "l2", 'name': "En curso"}]
+
+
+def day(n):
+    return datetime(2024, 1, n, 12, tzinfo=timezone.utc)
+
+
+def card(card_id, list_id, name=None):
+    return {'id': card_id, 'name': name or card_id, 'idList': list_id}
+
+
+def test_snapshots_store_only_deltas(tmp_path):
+    assert trello_logic.append_board_snapshot("b", [card("c1", "l1"), card("c2", "l1")], LISTS, tmp_path, day(1))
+    assert not trello_logic.append_board_snapshot("b", [card("c1", "l1"), card("c2", "l1")], LISTS, tmp_path, day(2))
+    assert trello_logic.append_board_snapshot("b", [card("c1", "l2"), card("c3", "l1")], LISTS, tmp_path, day(3))
+
+    store = trello_logic.load_snapshot_store("b", tmp_path)
+    assert store['taken_at'] == ["2024-01-01T12:00:00Z", "2024-01-03T12:00:00Z"]
+    assert store['set_cards'] == [[0, 1], [0, 2]]
+    assert store['set_lists'] == [[0, 0], [1, 0]]
+    assert store['removed'] == [[], [1]]
+
+
+def test_board_state_is_replayed_for_any_date(tmp_path):
+    trello_logic.append_board_snapshot("b", [card("c1", "l1"), card("c2", "l1")], LISTS, tmp_path, day(1))
+    trello_logic.append_board_snapshot("b", [card("c1", "l2"), card("c3", "l1")], LISTS, tmp_path, day(3))
+    store = trello_logic.load_snapshot_store("b", tmp_path)
+
+    def named_state(date):
+        _, state, card_names, list_names = trello_logic.get_board_state_at(store, date)
+        return {card_names[c]: list_names[l] for c, l in state.items()}
+
+    assert trello_logic.get_board_state_at(store, datetime(2023, 12, 31, tzinfo=timezone.utc))[0] is None
+    assert named_state(day(2)) == {"c1": "Nuevo", "c2": "Nuevo"}
+    assert named_state(day(3)) == {"c1": "En curso", "c3": "Nuevo"}
+    assert named_state(None) == named_state(day(3))
+
+
+def test_renames_are_kept_per_date(tmp_path):
+    trello_logic.append_board_snapshot("b", [card("c1", "l1", "Cliente A")], LISTS, tmp_path, day(1))
+    renamed_lists = [{'id': "l1", 'name': "Pendiente"}, LISTS[1]]
+    assert trello_logic.append_board_snapshot("b", [card("c1", "l1", "Cliente A2")], renamed_lists, tmp_path, day(2))
+
+    before, _ = trello_logic.generate_historical_status_report("b", day(1), tmp_path)
+    after, _ = trello_logic.generate_historical_status_report("b", day(2), tmp_path)
+    assert before[['Cliente', 'Etapa']].values.tolist() == [["Cliente A", "Nuevo"]]
+    assert after[['Cliente', 'Etapa']].values.tolist() == [["Cliente A2", "Pendiente"]]
+
+
+def test_snapshot_diff_report(tmp_path):
+    trello_logic.append_board_snapshot("b", [card("c1", "l1"), card("c2", "l1")], LISTS, tmp_path, day(1))
+    trello_logic.append_board_snapshot("b", [card("c1", "l2"), card("c2", "l1"), card("c3", "l2")], LISTS, tmp_path, day(3))
+
+    diff = trello_logic.generate_snapshot_diff_report("b", day(2), snapshot_dir=tmp_path)
+    assert diff['Cliente'].tolist() == ["c1", "c3"]
+    assert diff['Etapa Nueva'].tolist() == ["En curso", "En curso"]
+    assert diff['Etapa Anterior'].iloc[0] == "Nuevo"
+    assert diff['Etapa Anterior'].isna().iloc[1]
+
+
+def _append_many(snapshot_dir, card_id, count):
+    for i in range(count):
+        list_id = "l1" if i % 2 else "l2"
+        trello_logic.append_board_snapshot("b", [card(card_id, list_id)], LISTS, snapshot_dir)
+
+
+def test_concurrent_processes_do_not_lose_snapshots(tmp_path):
+    import multiprocessing
+
+    processes = [multiprocessing.Process(target=_append_many, args=(str(tmp_path), card_id, 15))
+                 for card_id in ("gui", "server")]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    store = trello_logic.load_snapshot_store("b", tmp_path)
+    assert len(store['taken_at']) == 30
+    assert sorted(store['card_ids']) == ["gui", "server"]
+    assert store['taken_at'] == sorted(store['taken_at'])